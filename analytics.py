@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import ijson
+import pandas as pd
+
+import transcript_stream
+import utils
+
+DEFAULT_SEASON_PATTERN = r"(20\d{2})"
+DEFAULT_BIN_MINUTES = 5
+YOUTUBE_TAGS_MAX_CHARS = 500
+
+# Top level keys analytics reads, everything else (words above all) is dropped as soon as it is parsed
+LOADED_KEYS = ("audio_duration", "iab_categories_result", "entities", "auto_highlights_result", "chapters")
+
+BENCHMARK_WORDS_PER_MINUTE = 150
+
+
+def episode_names(json_paths: List[str]) -> List[str]:
+    """
+    Names episodes by their json path relative to the directory all of them share, without the extension.
+    The transcription service caches every episode as <transcript id>/transcript.json, so basenames alone collide
+    """
+    json_paths = [os.path.abspath(json_path) for json_path in json_paths]
+    root = os.path.commonpath([os.path.dirname(json_path) for json_path in json_paths])
+    return [os.path.splitext(os.path.relpath(json_path, root))[0].replace(os.sep, "/") for json_path in json_paths]
+
+
+def read_transcript(json_path: str) -> Dict:
+    """
+    Reads the LOADED_KEYS of a saved transcript json in one pass. Top level values are built by ijson's C backend,
+    so the word arrays are never walked event by event in Python
+    """
+    with transcript_stream.open_transcript_file(json_path) as mapped:
+        return {key: value for key, value in ijson.kvitems(mapped, "", use_float=True) if key in LOADED_KEYS}
+
+
+def load_transcripts(json_paths: Iterable[str], season_pattern: str = DEFAULT_SEASON_PATTERN, processes: int = 1):
+    """
+    Yields (episode, season, transcript) for each saved transcript json, in order.
+    Parsing is CPU bound, with processes > 1 the jsons are parsed in a process pool
+    """
+    json_paths = list(json_paths)
+    season_regex = re.compile(season_pattern)
+    seasons = []
+    for json_path in json_paths:
+        match = season_regex.search(os.path.abspath(json_path))
+        seasons.append(match.group(1) if match else "unknown")
+
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as executor:
+            yield from zip(episode_names(json_paths), seasons,
+                           executor.map(read_transcript, json_paths, chunksize=8))
+    else:
+        yield from zip(episode_names(json_paths), seasons, map(read_transcript, json_paths))
+
+
+def build_frames(transcripts: Iterable[Tuple[str, str, Dict]]) -> Dict[str, pd.DataFrame]:
+    """
+    Flattens the IAB, entity, highlight and chapter results of many transcripts into one columnar frame each.
+    Rows are collected as plain tuples and each frame is built once, everything after that is vectorised
+    """
+    episodes, iab, entities, highlights, chapters = [], [], [], [], []
+    seen = set()
+    for episode, season, transcript in transcripts:
+        if episode in seen:
+            raise ValueError(f"episode {episode} appears more than once in the catalogue")
+        seen.add(episode)
+        episodes.append((episode, season, transcript.get("audio_duration")))
+
+        iab_result = transcript.get("iab_categories_result") or {}
+        if iab_result.get("status") == "success":
+            for result in iab_result["results"]:
+                start = result["timestamp"]["start"]
+                end = result["timestamp"]["end"]
+                for label in result["labels"]:
+                    iab.append((episode, start, end, label["label"], label["relevance"]))
+
+        for entity in transcript.get("entities") or []:
+            entities.append((episode, entity["start"], entity["end"], entity["entity_type"], entity["text"]))
+
+        highlight_result = transcript.get("auto_highlights_result") or {}
+        if highlight_result.get("status") == "success":
+            for highlight in highlight_result["results"]:
+                for timestamp in highlight["timestamps"]:
+                    highlights.append((episode, timestamp["start"], timestamp["end"], highlight["text"],
+                                       highlight["count"], highlight["rank"]))
+
+        for chapter in transcript.get("chapters") or []:
+            chapters.append((episode, chapter["start"], chapter["end"], chapter["headline"], chapter["gist"]))
+
+    frames = {
+        "episodes": pd.DataFrame(episodes, columns=["episode", "season", "audio_duration"]),
+        "iab": pd.DataFrame(iab, columns=["episode", "start", "end", "label", "relevance"]),
+        "entities": pd.DataFrame(entities, columns=["episode", "start", "end", "entity_type", "text"]),
+        "highlights": pd.DataFrame(highlights, columns=["episode", "start", "end", "text", "count", "rank"]),
+        "chapters": pd.DataFrame(chapters, columns=["episode", "start", "end", "headline", "gist"]),
+    }
+    for name, columns in (("iab", ["episode", "label"]), ("entities", ["episode", "entity_type", "text"]),
+                          ("highlights", ["episode", "text"]), ("chapters", ["episode"])):
+        frames[name] = frames[name].astype({column: "category" for column in columns})
+    return frames
+
+
+def label_level(labels: pd.Series, level: int = None) -> pd.Series:
+    """
+    Truncates IAB labels ("Sports>Soccer>...") to their first level + 1 parts, computed once per distinct label
+    """
+    if level is None:
+        return labels
+    categories = labels.cat.categories
+    truncated = categories.str.split(">").str[:level + 1].str.join(">")
+    return labels.map(pd.Series(truncated, index=categories)).astype("category")
+
+
+def topic_timeline(iab: pd.DataFrame, bin_minutes: int = DEFAULT_BIN_MINUTES, level: int = None) -> pd.DataFrame:
+    """
+    Relevance-weighted topics per episode and time bin, weighted by how long each labelled segment lasts
+    """
+    bin_ms = bin_minutes * 60_000
+    frame = pd.DataFrame({
+        "episode": iab["episode"],
+        "bin_start": (iab["start"] // bin_ms) * bin_ms,
+        "topic": label_level(iab["label"], level),
+        "weight": iab["relevance"] * (iab["end"] - iab["start"]) / 1000,
+    })
+    timeline = frame.groupby(["episode", "bin_start", "topic"], observed=True)["weight"].sum().reset_index()
+    timeline["share"] = timeline["weight"] / timeline.groupby(["episode", "bin_start"])["weight"].transform("sum")
+    bins = timeline["bin_start"].unique()
+    timeline["bin_start"] = timeline["bin_start"].map(dict(zip(bins, map(utils.transcript_time_to_timecode, bins))))
+    return timeline
+
+
+def entity_cooccurrence(entities: pd.DataFrame, bin_minutes: int = DEFAULT_BIN_MINUTES) -> pd.DataFrame:
+    """
+    Counts how often two entities are mentioned in the same time bin of an episode, across the catalogue
+    """
+    bin_ms = bin_minutes * 60_000
+    mentions = pd.DataFrame({
+        "episode": entities["episode"].cat.codes,
+        "bin": entities["start"] // bin_ms,
+        "entity": entities["text"].str.lower().astype("category"),
+    }).drop_duplicates()
+    mentions["code"] = mentions["entity"].cat.codes
+    pairs = mentions.merge(mentions, on=["episode", "bin"], suffixes=("_a", "_b"))
+    pairs = pairs[pairs["code_a"] < pairs["code_b"]]
+    counts = pairs.groupby(["entity_a", "entity_b"], observed=True).size().rename("count").reset_index()
+    return counts.sort_values("count", ascending=False, ignore_index=True)
+
+
+def season_trends(frames: Dict[str, pd.DataFrame], level: int = 0) -> pd.DataFrame:
+    """
+    Share of each topic in every season's total relevance-weighted airtime, one column per season
+    """
+    iab = frames["iab"]
+    seasons = frames["episodes"].set_index("episode")["season"]
+    frame = pd.DataFrame({
+        "season": iab["episode"].map(seasons),
+        "topic": label_level(iab["label"], level),
+        "weight": iab["relevance"] * (iab["end"] - iab["start"]) / 1000,
+    })
+    trends = frame.pivot_table(index="topic", columns="season", values="weight", aggfunc="sum",
+                               fill_value=0, observed=True)
+    if trends.empty:
+        # No successful IAB results anywhere in the catalogue
+        return trends
+    trends = trends / trends.sum()
+    return trends.sort_values(trends.columns[-1], ascending=False)
+
+
+def format_chapter_time(transcript_time) -> str:
+    minutes, seconds = divmod(int(transcript_time) // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+def seo_metadata(frames: Dict[str, pd.DataFrame], top_n: int = 15) -> Dict[str, Dict]:
+    """
+    Builds youtubeuploader metadata per episode: tags from the top topics, entities and highlights,
+    and a description listing the chapters
+    """
+    iab = frames["iab"]
+    topics = pd.DataFrame({
+        "episode": iab["episode"],
+        "tag": iab["label"].map(pd.Series(iab["label"].cat.categories.str.split(">").str[-1],
+                                          index=iab["label"].cat.categories)),
+        "weight": iab["relevance"] * (iab["end"] - iab["start"]),
+    }).groupby(["episode", "tag"], observed=True)["weight"].sum()
+    topic_tags = topics.sort_values(ascending=False).groupby(level="episode", observed=True).head(top_n)
+
+    entity_tags = frames["entities"].groupby(["episode", "text"], observed=True).size()
+    entity_tags = entity_tags.sort_values(ascending=False).groupby(level="episode", observed=True).head(top_n)
+
+    highlights = frames["highlights"].drop_duplicates(["episode", "text"])
+    highlight_tags = highlights.sort_values("rank", ascending=False).groupby("episode", observed=True).head(top_n)
+
+    tags = {}
+    for episode, tag in pd.concat([
+        topic_tags.reset_index()[["episode", "tag"]],
+        entity_tags.reset_index().rename(columns={"text": "tag"})[["episode", "tag"]],
+        highlight_tags.rename(columns={"text": "tag"})[["episode", "tag"]],
+    ]).astype({"episode": str, "tag": str}).itertuples(index=False):
+        tags.setdefault(episode, []).append(tag)
+
+    chapter_lines = {}
+    for episode, start, headline in frames["chapters"].sort_values(["episode", "start"])[
+            ["episode", "start", "headline"]].itertuples(index=False):
+        lines = chapter_lines.setdefault(episode, [])
+        lines.append(f"{format_chapter_time(0 if not lines else start)} {headline}")
+
+    metadata = {}
+    for episode in frames["episodes"]["episode"]:
+        episode_tags, length = [], 0
+        for tag in dict.fromkeys(tag.lower() for tag in tags.get(episode, [])):
+            length += len(tag) + 1
+            if length > YOUTUBE_TAGS_MAX_CHARS:
+                break
+            episode_tags.append(tag)
+        metadata[episode] = {
+            # Episodes are keyed by their path, the title is only the file name
+            "title": episode.rsplit("/", 1)[-1],
+            "description": "\n".join(chapter_lines.get(episode, [])),
+            "tags": episode_tags,
+        }
+    return metadata
+
+
+def synthetic_transcripts(episode_count: int, seed: int = 0) -> List[Tuple[str, str, Dict]]:
+    """
+    Generates transcripts shaped like AssemblyAI's IAB, entity, highlight and chapter results, for benchmarking
+    """
+    rng = random.Random(seed)
+    labels = [f"Category{a}>Sub{b}>Leaf{c}" for a in range(30) for b in range(8) for c in range(4)]
+    entity_types = ["person_name", "location", "organization", "occupation", "drug", "event"]
+    names = [f"Entity {n}" for n in range(2000)]
+    transcripts = []
+    for index in range(episode_count):
+        duration = rng.randint(3_600_000, 5 * 3_600_000)
+        segments = range(0, duration, 30_000)
+        transcripts.append((f"episode_{index:04}", str(2018 + index * 6 // episode_count), {
+            "audio_duration": duration // 1000,
+            "iab_categories_result": {"status": "success", "results": [
+                {"timestamp": {"start": start, "end": start + 30_000},
+                 "labels": [{"label": rng.choice(labels), "relevance": rng.random()} for _ in range(3)]}
+                for start in segments]},
+            "entities": [{"start": start, "end": start + 500, "entity_type": rng.choice(entity_types),
+                          "text": rng.choice(names)} for start in range(0, duration, 20_000)],
+            "auto_highlights_result": {"status": "success", "results": [
+                {"text": f"highlight {rng.randint(0, 5000)}", "count": 3, "rank": rng.random(),
+                 "timestamps": [{"start": rng.randrange(duration), "end": 0} for _ in range(3)]}
+                for _ in range(50)]},
+            "chapters": [{"start": start, "end": start + 600_000, "headline": f"Chapter at {start}", "gist": "gist"}
+                         for start in range(0, duration, 600_000)],
+        }))
+    return transcripts
+
+
+def write_synthetic_catalogue(transcripts: List[Tuple[str, str, Dict]], catalogue_dir: str) -> List[str]:
+    """
+    Writes synthetic transcripts as <catalogue_dir>/season_<season>/<episode>.json, with words spoken at
+    BENCHMARK_WORDS_PER_MINUTE ahead of the other keys like AssemblyAI's own responses
+    """
+    json_paths = []
+    for episode, season, transcript in transcripts:
+        word_ms = 60_000 // BENCHMARK_WORDS_PER_MINUTE
+        words = ",".join(f'{{"text":"word{index}","start":{start},"end":{start + word_ms - 50},'
+                         f'"confidence":0.93,"speaker":"{"AB"[index // 40 % 2]}"}}'
+                         for index, start in enumerate(range(0, transcript["audio_duration"] * 1000, word_ms)))
+        json_path = os.path.join(catalogue_dir, f"season_{season}", f"{episode}.json")
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        with open(json_path, "w") as f:
+            f.write('{"words":[' + words + "]," + json.dumps(transcript, separators=(",", ":"))[1:])
+        json_paths.append(json_path)
+    return json_paths
+
+
+def benchmark(episode_count: int, bin_minutes: int = DEFAULT_BIN_MINUTES, processes: int = 1):
+    print(f"Writing {episode_count} synthetic episodes")
+    with tempfile.TemporaryDirectory() as catalogue_dir:
+        json_paths = write_synthetic_catalogue(synthetic_transcripts(episode_count), catalogue_dir)
+        catalogue_bytes = sum(os.path.getsize(json_path) for json_path in json_paths)
+        timings = {}
+
+        start_time = time.perf_counter()
+        transcripts = list(load_transcripts(json_paths, r"season_(\d+)", processes))
+        timings["load_transcripts"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    frames = build_frames(transcripts)
+    timings["build_frames"] = time.perf_counter() - start_time
+    for name, function in (("topic_timeline", lambda: topic_timeline(frames["iab"], bin_minutes)),
+                           ("entity_cooccurrence", lambda: entity_cooccurrence(frames["entities"], bin_minutes)),
+                           ("season_trends", lambda: season_trends(frames)),
+                           ("seo_metadata", lambda: seo_metadata(frames))):
+        start_time = time.perf_counter()
+        function()
+        timings[name] = time.perf_counter() - start_time
+
+    print(f"{episode_count} episodes ({catalogue_bytes / 1_048_576:.0f} MiB of json), {len(frames['iab'])} IAB labels,"
+          f" {len(frames['entities'])} entities, {processes} process(es)")
+    for name, seconds in timings.items():
+        print(f"  {name}: {seconds:.3f}s")
+    print(f"  total: {sum(timings.values()):.3f}s")
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.benchmark:
+        benchmark(args.benchmark, args.bin_minutes, args.processes)
+        return 0
+    if not args.files:
+        print("no transcript json files given", file=sys.stderr)
+        return -1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        frames = build_frames(load_transcripts(args.files, args.season_pattern, args.processes))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return -1
+    print(f"Loaded {len(frames['episodes'])} episodes")
+
+    topic_timeline(frames["iab"], args.bin_minutes, args.level).to_csv(
+        os.path.join(args.output_dir, "topic_timeline.csv"), index=False)
+    entity_cooccurrence(frames["entities"], args.bin_minutes).to_csv(
+        os.path.join(args.output_dir, "entity_cooccurrence.csv"), index=False)
+    season_trends(frames, args.level or 0).to_csv(os.path.join(args.output_dir, "season_trends.csv"))
+
+    seo_dir = os.path.join(args.output_dir, "seo")
+    os.makedirs(seo_dir, exist_ok=True)
+    for episode, metadata in seo_metadata(frames).items():
+        seo_file_path = os.path.join(seo_dir, f"{episode}.json")
+        os.makedirs(os.path.dirname(seo_file_path), exist_ok=True)
+        with open(seo_file_path, "w") as f:
+            json.dump(metadata, f, indent=4)
+    print(f"Wrote analytics to {args.output_dir}")
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser('Aggregate IAB, entity and highlight analytics across saved transcripts')
+    parser.add_argument("-f", "--files", nargs='+', help="Transcript json files")
+    parser.add_argument("-o", "--output-dir", default="analytics", help="Directory to write csv and seo json to")
+    parser.add_argument("--bin-minutes", type=int, default=DEFAULT_BIN_MINUTES,
+                        help="Width of the topic timeline and co-occurrence bins")
+    parser.add_argument("--level", type=int, help="Optional: Truncate IAB labels to this level (0 is top level)")
+    parser.add_argument("--season-pattern", default=DEFAULT_SEASON_PATTERN,
+                        help="Regex matched against the json path, its first group is the season")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Number of processes parsing transcript jsons. Defaults to the number of CPUs")
+    parser.add_argument("--benchmark", type=int, metavar="EPISODES",
+                        help="Time loading and aggregating this many synthetic episodes written to disk instead")
+    return parser.parse_args(args=argv)
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
@@ -1,8 +1,5 @@
-import http
-import json
 import logging
 import os
-import time
 from collections import Counter
 import requests
 
@@ -15,8 +12,6 @@ from api_secrets import API_KEY_ASSEMBLYAI
 upload_endpoint = "https://api.assemblyai.com/v2/upload"
 transcript_endpoint = "https://api.assemblyai.com/v2/transcript"
 
-headers_auth_only = {'authorization': API_KEY_ASSEMBLYAI}
-
 headers_json = {
     "authorization": API_KEY_ASSEMBLYAI,
     "content-type": "application/json"
@@ -24,6 +19,33 @@ headers_json = {
 
 CHUNK_SIZE = 5_242_880  # 5MB
 
+TRANSCRIPT_CONFIG = {
+        "custom_spelling": [
+            {"from": ["Christina"], "to": "Krystyna"},
+            {"from": ["Krin", "Corrinne", "krin", "crin", "corinne", "Karen"], "to": "Corinne"},
+            {"from": ["Antislock"], "to": "Anti-Slut"},
+            {"from": ["anti fletching"], "to": "Anti-Slut-Shaming"},
+            {"from": ["sorry about last night's show@gmail.com"], "to": "sorryaboutlastnightshow@gmail.com"}
+            ],
+        "word_boost": ["anti-slut", "anti-slut-shaming", "Guys We Fucked", "Corinne", "Krystyna", "sorryaboutlastnightshow@gmail.com"],
+        "language_code": "en_us",
+        "auto_highlights": True,
+        "auto_chapters": True,
+        "entity_detection": True,
+        "iab_categories": True,
+        "speaker_labels": True
+    }
+
+
+class TranscriptRequestError(Exception):
+    """
+    A non-2xx AssemblyAI response, with its HTTP status code
+    """
+
+    def __init__(self, status_code, text):
+        super().__init__(text)
+        self.status_code = status_code
+
 
 def upload_file(file_path):
     """
@@ -49,7 +71,7 @@ def upload_file(file_path):
         data=read_file_with_progress(file_path)
     )
     if not upload_response.ok:
-        raise Exception(upload_response.text)
+        raise TranscriptRequestError(upload_response.status_code, upload_response.text)
     return upload_response.json()
 
 
@@ -64,88 +86,59 @@ def get_transcript(audio_url, data):
         json=data
     )
     if transcript_response.status_code != requests.codes.ok:
-        raise Exception(transcript_response.text)
+        raise TranscriptRequestError(transcript_response.status_code, transcript_response.text)
     return transcript_response.json()
 
 
-def poll_for_transcript(transcript_id, log=True):
+def open_excel_workbook(excel_file_path):
     """
-    Polls AssemblyAI for a transcript
+    Opens an Excel workbook in constant memory mode, rows are flushed to disk as soon as the next row is written
     """
-    start_time = time.time()
-    while True:
-        transcript_response = requests.get(
-            transcript_endpoint + "/" + transcript_id,
-            headers=headers_json
-        )
-        transcript_response_json = transcript_response.json()
-        if transcript_response_json["status"] == "completed":
-            return transcript_response_json
-        elif transcript_response_json["status"] == "failed":
-            print(transcript_response_json)
-            raise Exception(transcript_response_json['error'])
-        elif transcript_response_json["status"] == "error":
-            print(transcript_response_json)
-            raise Exception(transcript_response_json['error'])
-        else:
-            time.sleep(30)
-            if log:
-                print("Checking again in 30 secs")
-                print("Elapsed time:", time.time() - start_time)
-
-
-def get_srt(transcript_id):
-    response = requests.get(f"{transcript_endpoint}/{transcript_id}/srt", headers=headers_auth_only)
-    return response.text
+    return xlsxwriter.Workbook(excel_file_path, {"constant_memory": True})
 
 
-def get_paragraphs(transcript_id):
-    paragraphs_response = requests.get(f"{transcript_endpoint}/{transcript_id}/paragraphs", headers=headers_json)
-    paragraphs_response = paragraphs_response.json()
-
-    paragraphs = []
-    for para in paragraphs_response['paragraphs']:
-        paragraphs.append(para)
-
-    return paragraphs
-
-
-def write_transcript_to_excel(transcript_json, excel_file_path):
+def add_words_worksheet(workbook):
     """
-    Writes a transcript to an Excel file
+    Adds the words worksheet with its header row
     """
-    workbook = xlsxwriter.Workbook(excel_file_path)
     worksheet_words = workbook.add_worksheet("words")
-
-    # Write words
     worksheet_words.write(0, 0, "start")
     worksheet_words.write(0, 1, "end")
     worksheet_words.write(0, 2, "confidence")
     worksheet_words.write(0, 3, "speaker")
     worksheet_words.write(0, 4, "text")
-    row = 1
-    for word in transcript_json["words"]:
-        worksheet_words.write(row, 0, utils.transcript_time_to_timecode(word["start"]))
-        worksheet_words.write(row, 1, utils.transcript_time_to_timecode(word["end"]))
-        worksheet_words.write(row, 2, word["confidence"])
-        worksheet_words.write(row, 3, word["speaker"])
-        worksheet_words.write(row, 4, word["text"])
-        row += 1
-
-    if transcript_json.get("paragraphs"):
-        worksheet_paragraphs = workbook.add_worksheet("paragraphs")
-        worksheet_paragraphs.write(0, 0, "start")
-        worksheet_paragraphs.write(0, 1, "end")
-        worksheet_paragraphs.write(0, 2, "text")
-        row = 1
-        for paragraph in transcript_json["paragraphs"]:
-            worksheet_paragraphs.write(row, 0, utils.transcript_time_to_timecode(paragraph["start"]))
-            worksheet_paragraphs.write(row, 1, utils.transcript_time_to_timecode(paragraph["end"]))
-            worksheet_paragraphs.write(row, 2, paragraph["text"])
-            row += 1
-    else:
-        logging.warning("no paragraphs were detected")
+    return worksheet_words
+
+
+def write_word_row(worksheet_words, row, word):
+    worksheet_words.write(row, 0, utils.transcript_time_to_timecode(word["start"]))
+    worksheet_words.write(row, 1, utils.transcript_time_to_timecode(word["end"]))
+    worksheet_words.write(row, 2, word["confidence"])
+    worksheet_words.write(row, 3, word["speaker"])
+    worksheet_words.write(row, 4, word["text"])
+
+
+def add_paragraphs_worksheet(workbook):
+    """
+    Adds the paragraphs worksheet with its header row
+    """
+    worksheet_paragraphs = workbook.add_worksheet("paragraphs")
+    worksheet_paragraphs.write(0, 0, "start")
+    worksheet_paragraphs.write(0, 1, "end")
+    worksheet_paragraphs.write(0, 2, "text")
+    return worksheet_paragraphs
+
 
+def write_paragraph_row(worksheet_paragraphs, row, paragraph):
+    worksheet_paragraphs.write(row, 0, utils.transcript_time_to_timecode(paragraph["start"]))
+    worksheet_paragraphs.write(row, 1, utils.transcript_time_to_timecode(paragraph["end"]))
+    worksheet_paragraphs.write(row, 2, paragraph["text"])
+
+
+def write_intelligence_worksheets(workbook, transcript_json):
+    """
+    Writes the highlights, chapters, entities and IAB categories worksheets
+    """
     # Write highlights
     if transcript_json["auto_highlights"]:
         if transcript_json["auto_highlights_result"]["status"] == "success":
@@ -227,11 +220,3 @@ def write_transcript_to_excel(transcript_json, excel_file_path):
             logging.warning("iab_categories did not succeed")
     else:
         logging.warning("iab_categories were not configured")
-
-    workbook.close()
-
-
-def write_transcript_to_json(transcript_json, json_file_path):
-    with open(json_file_path, "w") as f:
-        json_object = json.dumps(transcript_json, indent=4)
-        f.write(json_object)
\ No newline at end of file
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+import transcript_stream
+import utils
+
+CAPTION_FORMATS = {
+    "srt": ".srt",
+    "vtt": ".vtt",
+    "ttml": ".xml",  # Premiere imports TTML/DFXP captions as .xml
+}
+
+DEFAULT_STYLE = {
+    "max_chars_per_line": 42,
+    "max_lines": 2,
+    "min_duration": 1000,  # ms
+    "max_duration": 7000,  # ms
+    "max_cps": 20,  # characters per second
+    "break_on_speaker": True,
+}
+
+SENTENCE_ENDINGS = (".", "?", "!")
+
+
+class CaptionBuilder:
+    """
+    Segments words into captions in a single pass, one word at a time.
+
+    A caption is closed when the next word would overflow the line layout, exceed the maximum duration or
+    reading speed, comes from a different speaker, or follows a sentence ending once the caption can be stretched
+    to the minimum duration. Caption ends are stretched towards the next caption's start to reach the minimum
+    duration and reading speed, so every word is looked at once and the whole pass is linear.
+    """
+
+    def __init__(self, style: Dict = None):
+        self.style = dict(DEFAULT_STYLE, **(style or {}))
+        self.captions = []
+        self._current = None
+        self._pending = None
+
+    def add_word(self, word: Dict):
+        text = word["text"]
+        if self._current is not None and self._should_break(word, text):
+            self._close_current()
+        if self._current is None:
+            self._current = {"start": word["start"], "end": word["end"], "speaker": word.get("speaker"),
+                             "lines": [text], "chars": len(text)}
+            return
+        self._place(text)
+        self._current["end"] = word["end"]
+        self._current["chars"] += len(text) + 1
+
+    def finish(self) -> List[Dict]:
+        self._close_current()
+        if self._pending is not None:
+            self._extend(self._pending, None)
+            self.captions.append(self._pending)
+            self._pending = None
+        return self.captions
+
+    def _should_break(self, word, text):
+        style = self.style
+        current = self._current
+        if style["break_on_speaker"] and word.get("speaker") != current["speaker"]:
+            return True
+        if not self._fits(text):
+            return True
+        duration = word["end"] - current["start"]
+        if duration > style["max_duration"]:
+            return True
+        chars = current["chars"] + len(text) + 1
+        if chars * 1000 > style["max_cps"] * max(duration, style["min_duration"]):
+            return True
+        # Short sentences share a caption unless it can be stretched to the minimum duration before the next word
+        sentence_ended = current["lines"][-1].endswith(SENTENCE_ENDINGS)
+        if sentence_ended and word["start"] - current["start"] >= style["min_duration"]:
+            return True
+        return False
+
+    def _fits(self, text):
+        lines = self._current["lines"]
+        if len(lines[-1]) + 1 + len(text) <= self.style["max_chars_per_line"]:
+            return True
+        return len(lines) < self.style["max_lines"] and len(text) <= self.style["max_chars_per_line"]
+
+    def _place(self, text):
+        lines = self._current["lines"]
+        if len(lines[-1]) + 1 + len(text) <= self.style["max_chars_per_line"]:
+            lines[-1] = f"{lines[-1]} {text}"
+        else:
+            lines.append(text)
+
+    def _close_current(self):
+        if self._current is None:
+            return
+        if self._pending is not None:
+            self._extend(self._pending, self._current["start"])
+            self.captions.append(self._pending)
+        self._pending = self._current
+        self._current = None
+
+    def _extend(self, caption, next_start):
+        style = self.style
+        reading_time = caption["chars"] * 1000 // style["max_cps"]
+        target = caption["start"] + max(style["min_duration"], reading_time)
+        target = min(target, caption["start"] + style["max_duration"])
+        if next_start is not None:
+            target = min(target, next_start)
+        caption["end"] = max(caption["end"], target)
+
+
+def build_captions(words, style: Dict = None) -> List[Dict]:
+    builder = CaptionBuilder(style)
+    for word in words:
+        builder.add_word(word)
+    return builder.finish()
+
+
+def format_srt(captions: List[Dict]) -> str:
+    blocks = []
+    for index, caption in enumerate(captions, start=1):
+        start = utils.transcript_time_to_timecode(caption["start"]).replace(".", ",")
+        end = utils.transcript_time_to_timecode(caption["end"]).replace(".", ",")
+        blocks.append(f"{index}\n{start} --> {end}\n" + "\n".join(caption["lines"]) + "\n")
+    return "\n".join(blocks)
+
+
+def format_vtt(captions: List[Dict]) -> str:
+    blocks = ["WEBVTT\n"]
+    for caption in captions:
+        start = utils.transcript_time_to_timecode(caption["start"])
+        end = utils.transcript_time_to_timecode(caption["end"])
+        blocks.append(f"{start} --> {end}\n" + "\n".join(caption["lines"]) + "\n")
+    return "\n".join(blocks)
+
+
+def format_ttml(captions: List[Dict]) -> str:
+    paragraphs = []
+    for caption in captions:
+        start = utils.transcript_time_to_timecode(caption["start"])
+        end = utils.transcript_time_to_timecode(caption["end"])
+        text = "<br/>".join(escape(line) for line in caption["lines"])
+        paragraphs.append(f'      <p begin="{start}" end="{end}">{text}</p>\n')
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<tt xmlns="http://www.w3.org/ns/ttml" xml:lang="en">\n'
+            '  <body>\n'
+            '    <div>\n'
+            + "".join(paragraphs) +
+            '    </div>\n'
+            '  </body>\n'
+            '</tt>\n')
+
+
+FORMATTERS = {
+    "srt": format_srt,
+    "vtt": format_vtt,
+    "ttml": format_ttml,
+}
+
+
+def write_captions(captions: List[Dict], caption_format: str, file_path: str):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(FORMATTERS[caption_format](captions))
+
+
+def main(argv):
+    args = parse_args(argv)
+    style = {
+        "max_chars_per_line": args.max_chars,
+        "max_lines": args.max_lines,
+        "min_duration": args.min_duration,
+        "max_duration": args.max_duration,
+        "max_cps": args.max_cps,
+        "break_on_speaker": not args.ignore_speakers,
+    }
+    title = args.title or os.path.splitext(os.path.basename(args.file))[0]
+    output_dir = os.path.abspath(args.output_dir) if args.output_dir else os.path.dirname(args.file)
+
+    builder = CaptionBuilder(style)
+    with transcript_stream.open_transcript_file(args.file) as mapped:
+        for key, value in transcript_stream.iter_transcript(mapped):
+            if key == "words" and isinstance(value, dict):
+                builder.add_word(value)
+    captions = builder.finish()
+    if not captions:
+        print("no words found in transcript json", file=sys.stderr)
+        return -1
+
+    for caption_format in args.formats:
+        file_path = os.path.join(output_dir, title + CAPTION_FORMATS[caption_format])
+        print(f"Writing {file_path}")
+        write_captions(captions, caption_format, file_path)
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser('Render captions locally from a saved transcript json')
+    parser.add_argument("-f", "--file", required=True, help="File path to transcript json")
+    parser.add_argument("-t", "--title", help="Optional: Title of output files. Defaults to name of json basename")
+    parser.add_argument("-o", "--output-dir",
+                        help="Optional: Directory to write output files to. Defaults to same directory as json.")
+    parser.add_argument("--formats", nargs='+', choices=list(CAPTION_FORMATS), default=["srt"],
+                        help="Caption formats to write, ttml is importable by Premiere")
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_STYLE["max_chars_per_line"],
+                        help="Maximum characters per line")
+    parser.add_argument("--max-lines", type=int, default=DEFAULT_STYLE["max_lines"],
+                        help="Maximum lines per caption")
+    parser.add_argument("--min-duration", type=int, default=DEFAULT_STYLE["min_duration"],
+                        help="Minimum caption duration in ms")
+    parser.add_argument("--max-duration", type=int, default=DEFAULT_STYLE["max_duration"],
+                        help="Maximum caption duration in ms")
+    parser.add_argument("--max-cps", type=int, default=DEFAULT_STYLE["max_cps"],
+                        help="Maximum reading speed in characters per second")
+    parser.add_argument("--ignore-speakers", action="store_true", help="Don't start a new caption on speaker change")
+    return parser.parse_args(args=argv)
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
 import os
 import time
 
 import assemblyai
+import captions
+import transcript_stream
 
 
 def parse_args():
@@ -13,6 +16,8 @@ def parse_args():
     parser.add_argument("-i", "--id", help='existing transcript id')
     parser.add_argument("-o", "--output-dir",
                         help='Optional: Directory to write output file to. Defaults to same directory as input file.')
+    parser.add_argument("--measure-memory", action="store_true",
+                        help="Optional: Report peak memory while writing the transcript outputs")
     return parser.parse_args()
 
 
@@ -63,20 +68,20 @@ if __name__ == '__main__':
         transcript_id = id_override
 
     print("Polling...")
-    transcript_json = assemblyai.poll_for_transcript(transcript_id)
+    transcript_stream.wait_for_transcript(transcript_id)
 
-    print("Getting paragraphs...")
-    transcript_json["paragraphs"] = assemblyai.get_paragraphs(transcript_id)
+    print(f"Writing {title}.xlsx and {title}.json")
+    caption_builder = captions.CaptionBuilder()
+    with transcript_stream.measure_peak_memory("Transcript ingest") if args.measure_memory else contextlib.nullcontext():
+        with transcript_stream.open_transcript_response(transcript_id) as raw, \
+                transcript_stream.open_transcript_response(transcript_id, "paragraphs") as paragraphs_raw:
+            transcript_stream.stream_transcript(raw,
+                                                excel_file_path=f"{output_dir}/{title}.xlsx",
+                                                json_file_path=f"{output_dir}/{title}.json",
+                                                paragraphs_fp=paragraphs_raw,
+                                                word_sinks=[caption_builder])
 
-    print(f"Writing {title}.xlsx")
-    assemblyai.write_transcript_to_excel(transcript_json, f"{output_dir}/{title}.xlsx")
-
-    print(f"Writing {title}.json")
-    assemblyai.write_transcript_to_json(transcript_json, f"{output_dir}/{title}.json")
-
-    print(f"Collecting {title}.srt")
-    srtData = assemblyai.get_srt(transcript_id)
-    with open(f"{output_dir}/{title}.srt", "w") as f:
-        f.write(srtData)
+    print(f"Writing {title}.srt")
+    captions.write_captions(caption_builder.finish(), "srt", f"{output_dir}/{title}.srt")
 
     print(f"Transcription took {time.time() - start_time} seconds")
@@ -3,33 +3,20 @@ import os
 import sys
 import argparse
 import tempfile
+import time
 
 import pandas as pd
 
 import assemblyai
+import silence
+import transcript_stream
+import transcription_service
 import utils
 from set_project_markers import clear_markers, insert_chapters
 
 
 VALID_STEPS = [1, 2, 3]
 
-TRANSCRIPT_CONFIG = {
-        "custom_spelling": [
-            {"from": ["Christina"], "to": "Krystyna"},
-            {"from": ["Krin", "Corrinne", "krin", "crin", "corinne", "Karen"], "to": "Corinne"},
-            {"from": ["Antislock"], "to": "Anti-Slut"},
-            {"from": ["anti fletching"], "to": "Anti-Slut-Shaming"},
-            {"from": ["sorry about last night's show@gmail.com"], "to": "sorryaboutlastnightshow@gmail.com"}
-            ],
-        "word_boost": ["anti-slut", "anti-slut-shaming", "Guys We Fucked", "Corinne", "Krystyna", "sorryaboutlastnightshow@gmail.com"],
-        "language_code": "en_us",
-        "auto_highlights": True,
-        "auto_chapters": True,
-        "entity_detection": True,
-        "iab_categories": True,
-        "speaker_labels": True
-    }
-
 
 def main(argv):
     args = parse_args(argv)
@@ -37,6 +24,10 @@ def main(argv):
     steps.sort()
     id_override = args.id
     xlsx_override = args.xlsx
+    json_override = args.json
+    silence_file = args.silence
+    service_url = args.service
+    job_id = args.job
 
     # Validate steps
     for step in steps:
@@ -55,37 +46,74 @@ def main(argv):
             temp_audio, extract_result = utils.extract_project_audio(pymiere_proj)
             print(f"  -- {extract_result}")
             print(f"  -- Audio: {temp_audio}")
+            print("  -- Building silence map")
+            silence_file = silence.silence_map_path(temp_audio)
+            levels, window_ms = silence.analyse_wav(temp_audio)
+            silence.write_silence_map(levels, silence_file, window_ms)
+            print(f"  -- Silence map: {silence_file}")
             print("== DONE")
         elif step == 2:
             print("== Getting transcript")
-            if temp_audio is None and id_override is None:
+            if temp_audio is None and id_override is None and json_override is None:
                 print(f"temp_audio is missing. Please include step 1")
                 return -1
-            if transcript_id:
-                print(f"  -- Using ID override: {transcript_id}")
-            else:
-                print("  -- Uploading file")
-                upload_response = assemblyai.upload_file(temp_audio)
-                audio_url = upload_response["upload_url"]
-                transcript_response = assemblyai.get_transcript(audio_url, TRANSCRIPT_CONFIG)
-                transcript_id = transcript_response["id"]
-                print(f"  -- Transcript ID: {transcript_id}")
-            print("  -- Waiting for data")
-            transcript_json = assemblyai.poll_for_transcript(transcript_id, log=False)
-            print("  -- Data ready")
-            print("  -- Saving transcript.xlsx")
             xlsx_file = os.path.join(tempfile.mkdtemp(), "transcript.xlsx")
-            assemblyai.write_transcript_to_excel(transcript_json, xlsx_file)
+            if service_url:
+                if transcript_id:
+                    job_id = transcription_service.submit_transcript_id(service_url, transcript_id)
+                else:
+                    print("  -- Sending audio to transcription service")
+                    job_id = transcription_service.submit_audio(service_url, temp_audio)
+                print(f"  -- Job ID: {job_id}")
+                if 3 not in steps:
+                    print(f"  -- Run step 3 with --job {job_id} once the job is completed")
+            elif json_override:
+                print(f"  -- Using JSON override: {json_override}")
+                print("  -- Saving transcript.xlsx")
+                with transcript_stream.open_transcript_file(json_override) as mapped:
+                    transcript_stream.stream_transcript(mapped, excel_file_path=xlsx_file)
+            else:
+                if transcript_id:
+                    print(f"  -- Using ID override: {transcript_id}")
+                else:
+                    print("  -- Uploading file")
+                    upload_response = assemblyai.upload_file(temp_audio)
+                    audio_url = upload_response["upload_url"]
+                    transcript_response = assemblyai.get_transcript(audio_url, assemblyai.TRANSCRIPT_CONFIG)
+                    transcript_id = transcript_response["id"]
+                    print(f"  -- Transcript ID: {transcript_id}")
+                print("  -- Waiting for data")
+                transcript_stream.wait_for_transcript(transcript_id, log=False)
+                print("  -- Data ready")
+                print("  -- Saving transcript.xlsx")
+                with transcript_stream.open_transcript_response(transcript_id) as raw:
+                    transcript_stream.stream_transcript(raw, excel_file_path=xlsx_file)
             print("== DONE")
         elif step == 3:
             print("== Updating Markers")
+            if service_url and job_id:
+                print("  -- Waiting for transcription service")
+                while True:
+                    job = transcription_service.job_status(service_url, job_id)
+                    if job["status"] == transcription_service.COMPLETED:
+                        break
+                    if job["status"] == transcription_service.FAILED:
+                        print(f"job {job_id} failed: {job['error']}")
+                        return -1
+                    time.sleep(transcription_service.POLL_INTERVAL)
+                xlsx_file = os.path.join(tempfile.mkdtemp(), "transcript.xlsx")
+                transcription_service.download_artifact(service_url, job_id, "transcript.xlsx", xlsx_file)
             if xlsx_file is None:
                 print(f"xlsx_file is missing. Please include step 2 or use override")
                 return -1
             clear_markers(all_markers)
             transcript_data = pd.read_excel(xlsx_file, sheet_name='chapters', index_col=None,
                                             header=0).transpose().to_dict().values()
-            insert_chapters(all_markers, transcript_data)
+            pauses = None
+            if silence_file:
+                print(f"  -- Snapping to pauses in {silence_file}")
+                pauses = silence.load_pauses(silence_file)
+            insert_chapters(all_markers, transcript_data, pauses, args.snap_tolerance)
             print("== DONE")
     return 0
 
@@ -99,6 +127,12 @@ def parse_args(argv):
                                                                    'example: 1 2')
     parser.add_argument('--id', help='Force transcript id for step 2')
     parser.add_argument('--xlsx', help='Force xlsx file for step 3')
+    parser.add_argument('--json', help='Force saved transcript json for step 2, skips the upload and polling')
+    parser.add_argument('--service', help='Transcription service url, step 2 enqueues a job instead of waiting')
+    parser.add_argument('--job', help='Transcription service job id for step 3')
+    parser.add_argument('--silence', help='Force silence map for step 3, built by step 1 otherwise')
+    parser.add_argument('--snap-tolerance', type=int, default=silence.DEFAULT_TOLERANCE_MS,
+                        help='Maximum distance in ms a marker is moved to reach a pause')
     return parser.parse_args(args=argv)
 
 
@@ -8,6 +8,7 @@ from typing import List
 import pandas as pd
 import pymiere
 
+import silence
 import utils
 
 
@@ -19,16 +20,26 @@ def main(argv):
         print("unable to open json file", file=sys.stderr)
         return -1
 
+    pauses = silence.load_pauses(args.silence) if args.silence else None
+
     pymiere_proj, all_markers = utils.setup_pymiere()
     clear_markers(all_markers)
-    insert_chapters(all_markers, transcript_data)
+    insert_chapters(all_markers, transcript_data, pauses, args.snap_tolerance)
 
     return 0
 
 
-def insert_chapters(all_markers: pymiere.MarkerCollection, chapters_list: List[Dict]):
-    for chapter in chapters_list:
-        cur_marker = all_markers.createMarker(utils.timecode_to_transcript_time(chapter["start"]))
+def insert_chapters(all_markers: pymiere.MarkerCollection, chapters_list: List[Dict], pauses=None,
+                    snap_tolerance: int = silence.DEFAULT_TOLERANCE_MS):
+    """
+    Inserts a marker per chapter, snapped to the nearest pause within snap_tolerance ms when pauses are given
+    """
+    chapters_list = list(chapters_list)
+    starts = [utils.timecode_to_transcript_time(chapter["start"]) for chapter in chapters_list]
+    if pauses is not None:
+        starts = silence.snap_times([start * 1000 for start in starts], pauses, snap_tolerance) / 1000
+    for chapter, start in zip(chapters_list, starts):
+        cur_marker = all_markers.createMarker(float(start))
         cur_marker.comments = chapter["gist"]
         print(f"Inserting marker: [{utils.transcript_time_to_timecode(cur_marker.start.seconds)} : {cur_marker.comments}]")
 
@@ -44,6 +55,9 @@ def clear_markers(all_markers: pymiere.MarkerCollection):
 def parse_args(argv):
     parser = argparse.ArgumentParser('Import transcript json and place markers in Premiere project')
     parser.add_argument("-f", "--file", help="File path to json")
+    parser.add_argument("--silence", help="Optional: Silence map to snap the markers to pauses")
+    parser.add_argument("--snap-tolerance", type=int, default=silence.DEFAULT_TOLERANCE_MS,
+                        help="Maximum distance in ms a marker is moved to reach a pause")
     return parser.parse_args(args=argv)
 
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import struct
+import argparse
+
+import numpy as np
+
+WINDOW_MS = 10
+CHUNK_SECONDS = 60
+DEFAULT_THRESHOLD_DB = -40
+DEFAULT_MIN_PAUSE_MS = 200
+DEFAULT_TOLERANCE_MS = 1500
+FLOOR_DB = -127  # silence map values are stored as int8 dBFS
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_layout(wav_file_path):
+    """
+    Reads the fmt and data chunk layout of a WAV file: (sample_rate, channels, bits, is_float, data_offset, data_size)
+    """
+    with open(wav_file_path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{wav_file_path} is not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{wav_file_path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                data = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", data[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                    format_tag = struct.unpack("<H", data[24:26])[0]
+                if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                    raise ValueError(f"unsupported WAV format {format_tag}")
+                fmt = (sample_rate, channels, bits, format_tag == WAVE_FORMAT_IEEE_FLOAT)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{wav_file_path} has no fmt chunk before its data")
+                data_size = min(chunk_size, os.path.getsize(wav_file_path) - f.tell())
+                return (*fmt, f.tell(), data_size)
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def _samples(mapped, bits, is_float):
+    """
+    Converts a chunk of memory mapped sample bytes to float32 in [-1, 1]
+    """
+    if is_float:
+        return np.frombuffer(mapped, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    if bits == 16:
+        return np.frombuffer(mapped, dtype="<i2").astype(np.float32) / 32768
+    if bits == 24:
+        raw = np.frombuffer(mapped, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        return values.astype(np.float32) / (1 << 23)
+    if bits == 32:
+        return np.frombuffer(mapped, dtype="<i4").astype(np.float32) / 2147483648
+    raise ValueError(f"unsupported WAV bit depth {bits}")
+
+
+def analyse_wav(wav_file_path, window_ms=WINDOW_MS):
+    """
+    Streams a WAV file once through memory mapped chunks and returns its RMS level in int8 dBFS per window,
+    with the window length in ms. Windows are a whole number of samples, so at sample rates like 22050 they are
+    slightly shorter than window_ms and the real length is returned for converting window indices to times.
+    All channels of a window are averaged in power, memory stays at one chunk regardless of the file length
+    """
+    sample_rate, channels, bits, is_float, data_offset, data_size = read_wav_layout(wav_file_path)
+    frame_bytes = channels * bits // 8
+    window_frames = sample_rate * window_ms // 1000
+    actual_window_ms = window_frames * 1000 / sample_rate
+    window_bytes = window_frames * frame_bytes
+    chunk_bytes = max(1, CHUNK_SECONDS * 1000 // window_ms) * window_bytes
+    window_count = data_size // window_bytes
+
+    levels = np.empty(window_count, dtype=np.int8)
+    if window_count == 0:
+        return levels, actual_window_ms
+    mapped = np.memmap(wav_file_path, dtype=np.uint8, mode="r", offset=data_offset,
+                       shape=(window_count * window_bytes,))
+    try:
+        for chunk_start in range(0, window_count * window_bytes, chunk_bytes):
+            chunk = mapped[chunk_start:chunk_start + chunk_bytes]
+            samples = _samples(chunk, bits, is_float).reshape(-1, window_frames * channels)
+            mean_square = np.einsum("ij,ij->i", samples, samples) / samples.shape[1]
+            with np.errstate(divide="ignore"):
+                level = 10 * np.log10(mean_square)
+            first = chunk_start // window_bytes
+            levels[first:first + len(level)] = np.clip(np.nan_to_num(level, neginf=FLOOR_DB), FLOOR_DB, 0)
+    finally:
+        del mapped
+    return levels, actual_window_ms
+
+
+def silence_map_path(path):
+    """
+    Silence maps are cached next to the audio or transcript they belong to
+    """
+    return os.path.splitext(path)[0] + ".silence.npz"
+
+
+def write_silence_map(levels, silence_file_path, window_ms=WINDOW_MS):
+    np.savez_compressed(silence_file_path, levels=levels, window_ms=window_ms)
+
+
+def read_silence_map(silence_file_path):
+    with np.load(silence_file_path) as data:
+        return data["levels"], float(data["window_ms"])
+
+
+def find_pauses(levels, window_ms=WINDOW_MS, threshold_db=DEFAULT_THRESHOLD_DB, min_pause_ms=DEFAULT_MIN_PAUSE_MS):
+    """
+    Returns (starts, ends) in ms of every run of windows below threshold_db lasting at least min_pause_ms
+    """
+    quiet = np.concatenate(([False], levels < threshold_db, [False]))
+    edges = np.flatnonzero(quiet[1:] != quiet[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * window_ms >= min_pause_ms
+    return starts[keep] * window_ms, ends[keep] * window_ms
+
+
+def snap_times(times_ms, pauses, tolerance_ms=DEFAULT_TOLERANCE_MS):
+    """
+    Moves each time into the nearest pause, never by more than tolerance_ms. The target is the middle of the
+    pause clamped to both the pause and the tolerance window, so times already inside a long pause stay close
+    to where they are. Times with no pause within tolerance_ms are left alone
+    """
+    times_ms = np.asarray(times_ms, dtype=np.float64)
+    starts, ends = pauses
+    if len(starts) == 0:
+        return times_ms
+    after = np.clip(np.searchsorted(starts, times_ms), 1, len(starts)) - 1
+    candidates = np.stack([after, np.minimum(after + 1, len(starts) - 1)])
+    # The part of each candidate pause that can be reached within the tolerance
+    low = np.maximum(starts[candidates], times_ms - tolerance_ms)
+    high = np.minimum(ends[candidates], times_ms + tolerance_ms)
+    targets = np.clip((starts[candidates] + ends[candidates]) / 2, low, high)
+    moves = np.where(low <= high, np.abs(targets - times_ms), np.inf)
+    best = np.argmin(moves, axis=0)
+    columns = np.arange(len(times_ms))
+    return np.where(np.isfinite(moves[best, columns]), targets[best, columns], times_ms)
+
+
+def load_pauses(silence_file_path, threshold_db=DEFAULT_THRESHOLD_DB, min_pause_ms=DEFAULT_MIN_PAUSE_MS):
+    levels, window_ms = read_silence_map(silence_file_path)
+    return find_pauses(levels, window_ms, threshold_db, min_pause_ms)
+
+
+def main(argv):
+    args = parse_args(argv)
+    output = args.output or silence_map_path(args.file)
+    start_time = time.time()
+    levels, window_ms = analyse_wav(args.file)
+    elapsed = time.time() - start_time
+    write_silence_map(levels, output, window_ms)
+    duration = len(levels) * window_ms / 1000
+    print(f"Analysed {duration:.0f}s of audio in {elapsed:.2f}s ({duration / max(elapsed, 1e-9):.0f}x real time)")
+    print(f"Wrote {output}")
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser('Build the silence map of a WAV file for chapter snapping')
+    parser.add_argument("-f", "--file", required=True, help="File path to wav")
+    parser.add_argument("-o", "--output", help="Optional: Silence map path. Defaults to <wav>.silence.npz")
+    return parser.parse_args(args=argv)
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
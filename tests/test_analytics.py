@@ -0,0 +1,28 @@
+import json
+
+import analytics
+
+
+def write_catalogue(tmp_path, transcripts):
+    json_paths = []
+    for relative_path, transcript in transcripts.items():
+        json_path = tmp_path / relative_path
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        json_path.write_text(json.dumps(transcript))
+        json_paths.append(str(json_path))
+    return json_paths
+
+
+def test_seo_title_is_the_file_name(tmp_path):
+    transcript = analytics.synthetic_transcripts(1)[0][2]
+    json_paths = write_catalogue(tmp_path, {"2021/Episode 12.json": transcript, "2022/Episode 12.json": transcript})
+    frames = analytics.build_frames(analytics.load_transcripts(json_paths))
+    metadata = analytics.seo_metadata(frames)
+    assert sorted(metadata) == ["2021/Episode 12", "2022/Episode 12"]
+    assert [episode["title"] for episode in metadata.values()] == ["Episode 12", "Episode 12"]
+
+
+def test_season_trends_without_iab_results(tmp_path):
+    json_paths = write_catalogue(tmp_path, {"2022/empty.json": {"audio_duration": 60, "iab_categories_result": None}})
+    frames = analytics.build_frames(analytics.load_transcripts(json_paths))
+    assert analytics.season_trends(frames).empty
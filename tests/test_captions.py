@@ -0,0 +1,73 @@
+import captions
+
+
+def words_from(text, start=0, word_ms=400, gap_ms=0, speaker="A"):
+    words = []
+    for text_word in text.split():
+        words.append({"text": text_word, "start": start, "end": start + word_ms, "speaker": speaker})
+        start += word_ms + gap_ms
+    return words
+
+
+def caption_texts(caption_list):
+    return [" ".join(caption["lines"]) for caption in caption_list]
+
+
+def test_short_sentences_share_a_caption():
+    caption_list = captions.build_captions(words_from("Yeah. Right. Totally."))
+    assert caption_texts(caption_list) == ["Yeah. Right. Totally."]
+
+
+def test_sentence_end_breaks_once_min_duration_is_reached():
+    caption_list = captions.build_captions(words_from("This is the first sentence. And this is the second."))
+    assert caption_texts(caption_list) == ["This is the first sentence.", "And this is the second."]
+
+
+def test_short_captions_are_stretched_to_min_duration():
+    words = words_from("Yeah.") + words_from("Okay then.", start=5000)
+    caption_list = captions.build_captions(words)
+    assert [(caption["start"], caption["end"]) for caption in caption_list] == [(0, 1000), (5000, 6000)]
+
+
+def test_stretching_stops_at_the_next_caption():
+    words = words_from("Yeah.") + words_from("Okay then.", start=600, speaker="B")
+    caption_list = captions.build_captions(words)
+    assert caption_list[0]["end"] == 600
+
+
+def test_lines_stay_within_the_layout():
+    style = {"max_chars_per_line": 16, "max_lines": 2, "max_cps": 1000}
+    caption_list = captions.build_captions(words_from("one two three four five six seven eight nine ten"), style)
+    for caption in caption_list:
+        assert len(caption["lines"]) <= 2
+        assert all(len(line) <= 16 for line in caption["lines"])
+    assert caption_texts(caption_list) == ["one two three four five six", "seven eight nine ten"]
+
+
+def test_max_duration_closes_a_caption():
+    style = {"max_duration": 2000, "max_cps": 1000}
+    caption_list = captions.build_captions(words_from("a b c d e f g h", word_ms=500), style)
+    assert all(caption["end"] - caption["start"] <= 2000 for caption in caption_list)
+    assert caption_texts(caption_list) == ["a b c d", "e f g h"]
+
+
+def test_reading_speed_closes_a_caption():
+    style = {"max_cps": 5, "min_duration": 0}
+    caption_list = captions.build_captions(words_from("abcdefghi abcdefghi abcdefghi", word_ms=1000), style)
+    assert caption_texts(caption_list) == ["abcdefghi", "abcdefghi", "abcdefghi"]
+
+
+def test_speaker_change_closes_a_caption():
+    words = words_from("hello there", speaker="A") + words_from("hi", start=800, speaker="B")
+    assert caption_texts(captions.build_captions(words)) == ["hello there", "hi"]
+    assert caption_texts(captions.build_captions(words, {"break_on_speaker": False})) == ["hello there hi"]
+
+
+def test_format_srt():
+    caption_list = captions.build_captions(words_from("Hello there."))
+    assert captions.format_srt(caption_list) == "1\n00:00:00,000 --> 00:00:01,000\nHello there.\n"
+
+
+def test_sentence_end_breaks_before_a_pause():
+    words = words_from("Yeah.") + words_from("Okay then.", start=1200)
+    assert caption_texts(captions.build_captions(words)) == ["Yeah.", "Okay then."]
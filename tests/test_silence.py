@@ -0,0 +1,49 @@
+import wave
+
+import numpy as np
+import pytest
+
+import silence
+
+
+def write_wav(wav_file_path, sample_rate, duration_s, pause_s, pause_length_s=1, channels=1):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-3000, 3000, size=(int(duration_s * sample_rate), channels), dtype=np.int16)
+    samples[int(pause_s * sample_rate):int((pause_s + pause_length_s) * sample_rate)] = 0
+    with wave.open(str(wav_file_path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+
+
+@pytest.mark.parametrize("sample_rate", [11025, 22050, 44100, 48000])
+def test_pause_is_found_where_it_was_written(tmp_path, sample_rate):
+    wav_file_path = tmp_path / "audio.wav"
+    write_wav(wav_file_path, sample_rate, duration_s=305, pause_s=300)
+    levels, window_ms = silence.analyse_wav(str(wav_file_path))
+    silence_file_path = str(tmp_path / "audio.silence.npz")
+    silence.write_silence_map(levels, silence_file_path, window_ms)
+    starts, ends = silence.load_pauses(silence_file_path)
+    assert len(starts) == 1
+    # Windows straddling the pause edges are not silent, so it can only appear up to a window shorter
+    assert 300_000 <= starts[0] <= 300_000 + window_ms
+    assert 301_000 - window_ms <= ends[0] <= 301_000
+
+
+def test_stereo_windows_average_both_channels(tmp_path):
+    wav_file_path = tmp_path / "audio.wav"
+    write_wav(wav_file_path, 48000, duration_s=3, pause_s=1, channels=2)
+    levels, window_ms = silence.analyse_wav(str(wav_file_path))
+    assert window_ms == 10
+    assert len(levels) == 300
+    assert (levels[100:200] == silence.FLOOR_DB).all()
+    assert (levels[:100] > silence.DEFAULT_THRESHOLD_DB).all()
+
+
+def test_snap_never_moves_further_than_the_tolerance():
+    pauses = (np.array([10_000, 20_000]), np.array([14_000, 20_500]))
+    times = [8_000, 9_000, 12_500, 18_600, 30_000]
+    snapped = silence.snap_times(times, pauses, tolerance_ms=1500)
+    assert snapped.tolist() == [8_000, 10_500, 12_000, 20_100, 30_000]
+    assert (np.abs(snapped - times) <= 1500).all()
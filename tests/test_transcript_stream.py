@@ -0,0 +1,62 @@
+import io
+import json
+import tracemalloc
+
+import transcript_stream
+
+
+def make_transcript(word_count, words_per_utterance=50):
+    words = [{"text": f"word{index}.", "start": index * 300, "end": index * 300 + 250, "confidence": 0.9,
+              "speaker": "AB"[index // words_per_utterance % 2]} for index in range(word_count)]
+    utterances = [{"text": " ".join(word["text"] for word in words[start:start + words_per_utterance]),
+                   "start": words[start]["start"], "end": words[start:start + words_per_utterance][-1]["end"],
+                   "confidence": 0.9, "speaker": words[start]["speaker"],
+                   "words": words[start:start + words_per_utterance]}
+                  for start in range(0, word_count, words_per_utterance)]
+    transcript = {"id": "test", "status": "completed", "text": None, "words": words, "utterances": utterances,
+                  "auto_highlights": False, "auto_chapters": False, "entity_detection": False, "iab_categories": False}
+    paragraphs = {"paragraphs": [dict(utterance) for utterance in utterances]}
+    return json.dumps(transcript).encode(), json.dumps(paragraphs).encode()
+
+
+def peak_memory(word_count, tmp_path):
+    transcript, paragraphs = make_transcript(word_count)
+    tracemalloc.start()
+    try:
+        transcript_stream.stream_transcript(io.BytesIO(transcript),
+                                            excel_file_path=str(tmp_path / f"{word_count}.xlsx"),
+                                            json_file_path=str(tmp_path / f"{word_count}.json"),
+                                            paragraphs_fp=io.BytesIO(paragraphs))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_stream_transcript_memory_is_bounded_with_speaker_labels(tmp_path):
+    small = peak_memory(1_000, tmp_path)
+    large = peak_memory(20_000, tmp_path)
+    assert large < small * 1.5
+
+
+def test_stream_transcript_round_trips_utterances(tmp_path):
+    transcript, paragraphs = make_transcript(120)
+    json_file_path = tmp_path / "transcript.json"
+    result = transcript_stream.stream_transcript(io.BytesIO(transcript), json_file_path=str(json_file_path),
+                                                 paragraphs_fp=io.BytesIO(paragraphs))
+    written = json.loads(json_file_path.read_text())
+    assert written == dict(json.loads(transcript), **json.loads(paragraphs))
+    assert "words" not in result and "utterances" not in result
+
+
+def test_stream_transcript_keeps_null_and_empty_arrays(tmp_path):
+    json_file_path = tmp_path / "transcript.json"
+    source = {"id": "test", "words": None, "utterances": []}
+    transcript_stream.stream_transcript(io.BytesIO(json.dumps(source).encode()), json_file_path=str(json_file_path),
+                                        paragraphs_fp=io.BytesIO(b'{"paragraphs": null}'))
+    assert json.loads(json_file_path.read_text()) == dict(source, paragraphs=None)
+
+
+def test_stream_transcript_adds_missing_words(tmp_path):
+    json_file_path = tmp_path / "transcript.json"
+    transcript_stream.stream_transcript(io.BytesIO(b'{"id": "test"}'), json_file_path=str(json_file_path))
+    assert json.loads(json_file_path.read_text()) == {"id": "test", "words": []}
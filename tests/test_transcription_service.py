@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import assemblyai
+import transcription_service
+
+
+@pytest.fixture
+def service(tmp_path):
+    audio_root = tmp_path / "audio"
+    audio_root.mkdir()
+    (audio_root / "episode.wav").write_bytes(b"RIFF")
+    return transcription_service.TranscriptionService(str(tmp_path / "cache"), audio_root=str(audio_root))
+
+
+@pytest.mark.parametrize("transcript_id", ["../transcript/abc123", "abc/def", "..", "", "abc 123", 42])
+def test_invalid_transcript_ids_are_rejected(service, transcript_id):
+    with pytest.raises((ValueError, KeyError)):
+        service.add_request({"id": transcript_id})
+
+
+def test_transcript_id_job(service):
+    job = service.queue.get(service.add_request({"id": "6qxk2j3c-7a2b-4f2e", "title": "episode"}))
+    assert (job["status"], job["transcript_id"]) == (transcription_service.SUBMITTED, "6qxk2j3c-7a2b-4f2e")
+
+
+@pytest.mark.parametrize("request_body", [[1], "file", None, {"id": "abc", "config": [1]}, {"id": "abc", "title": 1}])
+def test_malformed_requests_are_rejected(service, request_body):
+    with pytest.raises(ValueError):
+        service.add_request(request_body)
+
+
+def test_files_must_be_under_the_audio_root(service, tmp_path):
+    (tmp_path / "secret.wav").write_bytes(b"RIFF")
+    for file_path in (str(tmp_path / "secret.wav"), "../secret.wav", "/etc/passwd"):
+        with pytest.raises(ValueError):
+            service.add_request({"file": file_path})
+    job = service.queue.get(service.add_request({"file": "episode.wav"}))
+    assert job["audio_path"] == os.path.join(service.audio_root, "episode.wav")
+
+
+def test_file_requests_are_disabled_without_an_audio_root(tmp_path):
+    service = transcription_service.TranscriptionService(str(tmp_path / "cache"))
+    with pytest.raises(ValueError):
+        service.add_request({"file": __file__})
+
+
+def run_worker(service, job_id, done_statuses):
+    threading.Thread(target=service.work, daemon=True).start()
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = service.queue.get(job_id)
+        if job["status"] in done_statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_transient_upload_errors_are_retried(service, monkeypatch):
+    failures = [requests.ConnectionError("connection reset"), assemblyai.TranscriptRequestError(502, "bad gateway")]
+
+    def upload_file(file_path):
+        if failures:
+            raise failures.pop(0)
+        return {"upload_url": "https://example.com/upload"}
+
+    monkeypatch.setattr(transcription_service, "POLL_INTERVAL", 0)
+    monkeypatch.setattr(assemblyai, "upload_file", upload_file)
+    monkeypatch.setattr(assemblyai, "get_transcript", lambda audio_url, config: {"id": "abc123"})
+    job = run_worker(service, service.add_request({"file": "episode.wav"}),
+                     (transcription_service.SUBMITTED, transcription_service.FAILED))
+    assert (job["status"], job["transcript_id"], failures) == (transcription_service.SUBMITTED, "abc123", [])
+
+
+def test_client_errors_fail_the_job(service, monkeypatch):
+    def upload_file(file_path):
+        raise assemblyai.TranscriptRequestError(400, "unsupported audio")
+
+    monkeypatch.setattr(assemblyai, "upload_file", upload_file)
+    job = run_worker(service, service.add_request({"file": "episode.wav"}), (transcription_service.FAILED,))
+    assert job["error"] == "unsupported audio"
+
+
+def test_duplicate_files_are_uploaded_once(service, monkeypatch):
+    uploads = []
+    release = threading.Event()
+
+    def upload_file(file_path):
+        uploads.append(file_path)
+        release.wait(5)
+        return {"upload_url": "https://example.com/upload"}
+
+    monkeypatch.setattr(assemblyai, "upload_file", upload_file)
+    monkeypatch.setattr(assemblyai, "get_transcript", lambda audio_url, config: {"id": "abc123"})
+    first = service.add_request({"file": "episode.wav"})
+    threading.Thread(target=service.work, daemon=True).start()
+    second = service.add_request({"file": "episode.wav"})
+    release.set()
+    for job_id in (first, second):
+        job = run_worker(service, job_id, (transcription_service.SUBMITTED, transcription_service.FAILED))
+        assert (job["status"], job["transcript_id"]) == (transcription_service.SUBMITTED, "abc123")
+    third = service.queue.get(service.add_request({"file": "episode.wav"}))
+    assert (third["status"], third["transcript_id"]) == (transcription_service.SUBMITTED, "abc123")
+    assert len(uploads) == 1
+
+
+def test_http_errors_get_a_response(service):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), transcription_service.make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert requests.post(f"{url}/jobs", json=[1]).status_code == 400
+        assert requests.post(f"{url}/jobs", json={"id": "../transcript/abc123"}).status_code == 400
+        job_id = service.add_request({"id": "abc123"})
+        service.queue.update(job_id, status=transcription_service.COMPLETED)
+        assert requests.get(f"{url}/jobs/{job_id}/transcript.xlsx").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,254 @@
+import json
+import logging
+import mmap
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import ijson
+import requests
+from ijson.common import ObjectBuilder
+
+import assemblyai
+
+# Top level keys whose arrays are streamed item by item instead of being built whole. Utterances carry a second
+# copy of every word when speaker_labels is on
+STREAMED_KEYS = ("words", "paragraphs", "utterances")
+
+SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+
+def iter_transcript(fp):
+    """
+    Incrementally parses a transcript JSON document from a file-like object.
+    Yields (key, item) once per item of the STREAMED_KEYS arrays and (key, value) for every other top level key,
+    so only one word (or paragraph, or utterance) is held in memory at a time. An empty or null STREAMED_KEYS
+    value has no items and is yielded whole, as (key, []) or (key, None)
+    """
+    key = None
+    streaming = False
+    items = 0
+    builder = None
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if prefix == "":
+            if event == "map_key":
+                key = value
+                streaming = False
+            continue
+
+        if prefix == key and key in STREAMED_KEYS:
+            if event == "start_array":
+                streaming = True
+                items = 0
+                continue
+            if event == "end_array" and streaming:
+                if items == 0:
+                    yield key, []
+                continue
+
+        item_prefix = f"{key}.item" if streaming else key
+        if builder is None:
+            builder = ObjectBuilder()
+        builder.event(event, value)
+        if prefix == item_prefix and event in SCALAR_EVENTS + ("end_map", "end_array"):
+            items += 1
+            yield key, builder.value
+            builder = None
+
+
+@contextmanager
+def open_transcript_file(json_file_path):
+    """
+    Memory maps a transcript JSON file for iter_transcript
+    """
+    with open(json_file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+@contextmanager
+def open_transcript_response(transcript_id, resource=None):
+    """
+    Opens the completed transcript, or one of its resources (e.g. "paragraphs"), as a streamed HTTP response body
+    for iter_transcript
+    """
+    url = assemblyai.transcript_endpoint + "/" + transcript_id
+    if resource:
+        url += "/" + resource
+    with requests.get(url, headers=assemblyai.headers_json, stream=True) as response:
+        if not response.ok:
+            raise assemblyai.TranscriptRequestError(response.status_code, response.text)
+        response.raw.decode_content = True
+        yield response.raw
+
+
+def wait_for_transcript(transcript_id, log=True):
+    """
+    Polls AssemblyAI until a transcript is completed, without loading the transcript body.
+    Each poll only reads the response up to the top level status (and error) fields
+    """
+    start_time = time.time()
+    while True:
+        with open_transcript_response(transcript_id) as raw:
+            status, error = read_transcript_status(raw)
+        if status == "completed":
+            return
+        elif status in ("failed", "error"):
+            raise Exception(error)
+        else:
+            time.sleep(30)
+            if log:
+                print("Checking again in 30 secs")
+                print("Elapsed time:", time.time() - start_time)
+
+
+def read_transcript_status(fp):
+    status = None
+    error = None
+    for prefix, event, value in ijson.parse(fp):
+        if prefix == "status" and event == "string":
+            status = value
+        elif prefix == "error" and event == "string":
+            error = value
+        if status is not None and (status not in ("failed", "error") or error is not None):
+            break
+    return status, error
+
+
+class CompactJsonWriter:
+    """
+    Writes a compact JSON object one key (or one array item) at a time
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.encoder = json.JSONEncoder(separators=(",", ":"))
+        self.first_key = True
+        self.written_keys = set()
+        self.open_array = None
+        self.first_item = True
+        self.f.write("{")
+
+    def write(self, key, value):
+        self._close_array()
+        self._write_key(key)
+        for chunk in self.encoder.iterencode(value):
+            self.f.write(chunk)
+
+    def write_item(self, key, item):
+        if self.open_array != key:
+            self._close_array()
+            self._write_key(key)
+            self.f.write("[")
+            self.open_array = key
+            self.first_item = True
+        if not self.first_item:
+            self.f.write(",")
+        self.first_item = False
+        for chunk in self.encoder.iterencode(item):
+            self.f.write(chunk)
+
+    def close(self):
+        self._close_array()
+        self.f.write("}")
+
+    def _write_key(self, key):
+        if not self.first_key:
+            self.f.write(",")
+        self.first_key = False
+        self.written_keys.add(key)
+        self.f.write(self.encoder.encode(key))
+        self.f.write(":")
+
+    def _close_array(self):
+        if self.open_array is not None:
+            self.f.write("]")
+            self.open_array = None
+
+
+def stream_transcript(fp, excel_file_path=None, json_file_path=None, paragraphs_fp=None, word_sinks=()):
+    """
+    Parses a transcript from fp in one pass, writing words to the Excel and JSON outputs as they arrive.
+    paragraphs_fp is an optional /paragraphs response body, streamed the same way one paragraph at a time.
+    word_sinks are objects with an add_word method (e.g. captions.CaptionBuilder) fed every word.
+    Returns the transcript without its words, paragraphs and utterances
+    """
+    workbook = None
+    worksheet_words = None
+    json_file = None
+    json_writer = None
+    if excel_file_path:
+        workbook = assemblyai.open_excel_workbook(excel_file_path)
+        worksheet_words = assemblyai.add_words_worksheet(workbook)
+    if json_file_path:
+        json_file = open(json_file_path, "w")
+        json_writer = CompactJsonWriter(json_file)
+
+    try:
+        transcript = {}
+        rows = {"words": 1, "paragraphs": 1}
+        worksheets = {"words": worksheet_words}
+
+        def write_item(key, item):
+            if workbook is not None and key in rows:
+                if key == "words":
+                    assemblyai.write_word_row(worksheets["words"], rows["words"], item)
+                else:
+                    if "paragraphs" not in worksheets:
+                        worksheets["paragraphs"] = assemblyai.add_paragraphs_worksheet(workbook)
+                    assemblyai.write_paragraph_row(worksheets["paragraphs"], rows["paragraphs"], item)
+                rows[key] += 1
+            if key == "words":
+                for sink in word_sinks:
+                    sink.add_word(item)
+            if json_writer is not None:
+                json_writer.write_item(key, item)
+
+        for key, value in iter_transcript(fp):
+            if key in STREAMED_KEYS and isinstance(value, dict):
+                write_item(key, value)
+            else:
+                transcript[key] = value
+                if json_writer is not None:
+                    json_writer.write(key, value)
+
+        if paragraphs_fp is not None:
+            for key, value in iter_transcript(paragraphs_fp):
+                if key == "paragraphs" and isinstance(value, dict):
+                    write_item(key, value)
+                elif key == "paragraphs" and json_writer is not None:
+                    json_writer.write(key, value)
+        if workbook is not None and "paragraphs" not in worksheets:
+            logging.warning("no paragraphs were detected")
+
+        # Keep the keys readers expect when the source left them out
+        if json_writer is not None:
+            for key in ("words", "paragraphs") if paragraphs_fp is not None else ("words",):
+                if key not in json_writer.written_keys:
+                    json_writer.write(key, [])
+
+        if workbook is not None:
+            assemblyai.write_intelligence_worksheets(workbook, transcript)
+        if json_writer is not None:
+            json_writer.close()
+    finally:
+        if workbook is not None:
+            workbook.close()
+        if json_file is not None:
+            json_file.close()
+
+    return transcript
+
+
+@contextmanager
+def measure_peak_memory(label):
+    """
+    Prints the peak Python heap allocation of the enclosed block
+    """
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label} peak memory: {peak / 1_048_576:.1f} MiB")
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Long running transcription service shared by several editors.
+
+Jobs are submitted over HTTP and persisted in a SQLite queue inside the cache directory, so a restart picks up
+where it left off. A bounded pool of workers uploads audio and exports finished transcripts, while a single poller
+thread checks AssemblyAI for submitted transcripts, which caps the API concurrency of the whole shop.
+
+    POST /jobs                   audio body (any content type), optional ?title=
+    POST /jobs                   application/json {"file": path under --audio-root} or {"id": transcript id}
+    GET  /jobs/<job>             job status
+    GET  /jobs/<job>/<artifact>  transcript.xlsx, transcript.json or transcript.srt once completed
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+import urllib3
+
+import assemblyai
+import captions
+import transcript_stream
+
+ARTIFACTS = {
+    "transcript.xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "transcript.json": "application/json",
+    "transcript.srt": "application/x-subrip",
+}
+
+POLL_INTERVAL = 30  # seconds
+EXPORT_PREFIX = ".export-"
+TRANSCRIPT_ID_PATTERN = re.compile(r"[A-Za-z0-9-]+")
+
+# Job status flow: queued -> submitted -> ready -> completed, any stage can end in failed
+QUEUED = "queued"
+SUBMITTED = "submitted"
+READY = "ready"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def is_client_error(status_code):
+    """
+    4xx responses won't succeed on retry, except rate limiting and timeouts
+    """
+    return 400 <= status_code < 500 and status_code not in (HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_MANY_REQUESTS)
+
+
+def is_transient_error(e):
+    """
+    Network failures (including a streamed response dropping midway) and non client error responses may succeed
+    on retry
+    """
+    if isinstance(e, assemblyai.TranscriptRequestError):
+        return not is_client_error(e.status_code)
+    return isinstance(e, (requests.RequestException, urllib3.exceptions.HTTPError))
+
+
+class JobQueue:
+    """
+    SQLite backed job queue, safe to share between the HTTP handlers, workers and poller
+    """
+
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    claimed INTEGER NOT NULL DEFAULT 0,
+                    title TEXT,
+                    audio_path TEXT,
+                    source_key TEXT,
+                    config TEXT,
+                    transcript_id TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )""")
+            # Anything a worker held when the service stopped goes back to the queue
+            self.db.execute("UPDATE jobs SET claimed = 0")
+
+    def add(self, title=None, audio_path=None, source_key=None, config=None, transcript_id=None):
+        """
+        Adds a job. A job for a source that was already submitted shares its transcript, while one whose source
+        is still queued waits for it (see claim and submitted) instead of uploading the same audio again
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        status = SUBMITTED if transcript_id else QUEUED
+        with self.lock, self.db:
+            if source_key:
+                cached = self.db.execute(
+                    "SELECT transcript_id FROM jobs WHERE source_key = ? AND status IN (?, ?, ?)"
+                    " AND transcript_id IS NOT NULL ORDER BY updated DESC",
+                    (source_key, SUBMITTED, READY, COMPLETED)).fetchone()
+                if cached:
+                    transcript_id = cached["transcript_id"]
+                    status = SUBMITTED
+            self.db.execute(
+                "INSERT INTO jobs (id, status, title, audio_path, source_key, config, transcript_id, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, title, audio_path, source_key, json.dumps(config or assemblyai.TRANSCRIPT_CONFIG),
+                 transcript_id, now, now))
+            self.available.notify()
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def with_status(self, status):
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM jobs WHERE status = ? AND claimed = 0 ORDER BY created",
+                                   (status,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, statuses):
+        """
+        Blocks until a job in one of statuses is unclaimed, then claims it for the calling worker.
+        A queued job is skipped while an earlier queued job has the same source
+        """
+        placeholders = ",".join("?" * len(statuses))
+        with self.available:
+            while True:
+                row = self.db.execute(
+                    f"SELECT * FROM jobs AS job WHERE status IN ({placeholders}) AND claimed = 0"
+                    " AND NOT (status = ? AND source_key IS NOT NULL AND EXISTS ("
+                    "   SELECT 1 FROM jobs AS earlier WHERE earlier.source_key = job.source_key"
+                    "   AND earlier.status = ? AND (earlier.created, earlier.id) < (job.created, job.id)))"
+                    " ORDER BY created LIMIT 1",
+                    (*statuses, QUEUED, QUEUED)).fetchone()
+                if row:
+                    with self.db:
+                        self.db.execute("UPDATE jobs SET claimed = 1 WHERE id = ?", (row["id"],))
+                    return dict(row)
+                self.available.wait()
+
+    def submitted(self, job_id, transcript_id):
+        """
+        Marks a job as submitted, along with every queued job waiting on the same source
+        """
+        now = time.time()
+        with self.available, self.db:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, transcript_id = ?, claimed = 0, updated = ? WHERE id = ? OR ("
+                " status = ? AND source_key = (SELECT source_key FROM jobs WHERE id = ?))",
+                (SUBMITTED, transcript_id, now, job_id, QUEUED, job_id))
+            self.available.notify_all()
+
+    def update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        fields.setdefault("claimed", 0)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.available, self.db:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.available.notify_all()
+
+
+class TranscriptionService:
+
+    def __init__(self, cache_dir, workers=2, audio_root=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        # {"file": ...} requests are only accepted for audio under this directory, and are disabled without it
+        self.audio_root = os.path.realpath(audio_root) if audio_root else None
+        self.upload_dir = os.path.join(self.cache_dir, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.queue = JobQueue(os.path.join(self.cache_dir, "jobs.sqlite3"))
+        self.workers = workers
+        self.export_locks = {}
+        self.export_locks_lock = threading.Lock()
+        # Exports interrupted by a crash are redone, drop what they left behind
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(EXPORT_PREFIX):
+                shutil.rmtree(os.path.join(self.cache_dir, name))
+
+    def start(self):
+        for index in range(self.workers):
+            threading.Thread(target=self.work, name=f"worker-{index}", daemon=True).start()
+        threading.Thread(target=self.poll, name="poller", daemon=True).start()
+
+    def artifact_dir(self, transcript_id):
+        # Transcript ids become directory names, never let one reach outside the cache
+        if not TRANSCRIPT_ID_PATTERN.fullmatch(transcript_id or ""):
+            raise ValueError(f"invalid transcript id {transcript_id!r}")
+        return os.path.join(self.cache_dir, transcript_id)
+
+    def work(self):
+        while True:
+            job = self.queue.claim((QUEUED, READY))
+            try:
+                if job["status"] == QUEUED:
+                    self.submit(job)
+                else:
+                    self.export(job)
+            except Exception as e:
+                if is_transient_error(e):
+                    print(f"Job {job['id']} failed, retrying: {e}", file=sys.stderr)
+                    # Back off before the job goes back to the queue, or the next claim would retry it right away
+                    time.sleep(POLL_INTERVAL)
+                    self.queue.update(job["id"])
+                else:
+                    print(f"Job {job['id']} failed: {e}", file=sys.stderr)
+                    self.queue.update(job["id"], status=FAILED, error=str(e))
+
+    def submit(self, job):
+        print(f"Uploading {job['audio_path']} for job {job['id']}")
+        upload_response = assemblyai.upload_file(job["audio_path"])
+        transcript_response = assemblyai.get_transcript(upload_response["upload_url"], json.loads(job["config"]))
+        self.queue.submitted(job["id"], transcript_response["id"])
+
+    def export(self, job):
+        transcript_id = job["transcript_id"]
+        with self.export_lock(transcript_id):
+            if not self.is_exported(transcript_id):
+                print(f"Exporting transcript {transcript_id} for job {job['id']}")
+                self.write_artifacts(transcript_id)
+        if job["audio_path"] and job["audio_path"].startswith(self.upload_dir):
+            os.remove(job["audio_path"])
+        self.queue.update(job["id"], status=COMPLETED)
+
+    def export_lock(self, transcript_id):
+        with self.export_locks_lock:
+            return self.export_locks.setdefault(transcript_id, threading.Lock())
+
+    def is_exported(self, transcript_id):
+        output_dir = self.artifact_dir(transcript_id)
+        return all(os.path.exists(os.path.join(output_dir, name)) for name in ARTIFACTS)
+
+    def write_artifacts(self, transcript_id):
+        """
+        Writes the artifacts into a temporary directory that is moved into place once complete,
+        so a partly written export never looks cached
+        """
+        output_dir = self.artifact_dir(transcript_id)
+        temp_dir = tempfile.mkdtemp(prefix=EXPORT_PREFIX, dir=self.cache_dir)
+        try:
+            caption_builder = captions.CaptionBuilder()
+            with transcript_stream.open_transcript_response(transcript_id) as raw, \
+                    transcript_stream.open_transcript_response(transcript_id, "paragraphs") as paragraphs_raw:
+                transcript_stream.stream_transcript(raw,
+                                                    excel_file_path=os.path.join(temp_dir, "transcript.xlsx"),
+                                                    json_file_path=os.path.join(temp_dir, "transcript.json"),
+                                                    paragraphs_fp=paragraphs_raw,
+                                                    word_sinks=[caption_builder])
+            captions.write_captions(caption_builder.finish(), "srt", os.path.join(temp_dir, "transcript.srt"))
+            if os.path.exists(output_dir):
+                shutil.rmtree(output_dir)
+            os.replace(temp_dir, output_dir)
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+
+    def poll(self):
+        while True:
+            for job in self.queue.with_status(SUBMITTED):
+                try:
+                    if self.is_exported(job["transcript_id"]):
+                        self.queue.update(job["id"], status=READY)
+                        continue
+                    with transcript_stream.open_transcript_response(job["transcript_id"]) as raw:
+                        status, error = transcript_stream.read_transcript_status(raw)
+                    if status == "completed":
+                        self.queue.update(job["id"], status=READY)
+                    elif status in ("failed", "error"):
+                        self.queue.update(job["id"], status=FAILED, error=error)
+                except ValueError as e:
+                    print(f"Job {job['id']} failed: {e}", file=sys.stderr)
+                    self.queue.update(job["id"], status=FAILED, error=str(e))
+                except assemblyai.TranscriptRequestError as e:
+                    if is_client_error(e.status_code):
+                        print(f"Job {job['id']} failed: {e}", file=sys.stderr)
+                        self.queue.update(job["id"], status=FAILED, error=str(e))
+                    else:
+                        print(f"Polling job {job['id']} failed, retrying: {e}", file=sys.stderr)
+                except Exception as e:
+                    print(f"Polling job {job['id']} failed, retrying: {e}", file=sys.stderr)
+            time.sleep(POLL_INTERVAL)
+
+    def add_upload(self, body, length, title=None):
+        job_audio = os.path.join(self.upload_dir, uuid.uuid4().hex + ".wav")
+        with open(job_audio, "wb") as f:
+            remaining = length
+            while remaining > 0:
+                data = body.read(min(assemblyai.CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+        return self.queue.add(title=title, audio_path=job_audio)
+
+    def add_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("expected a json object")
+        config = request.get("config")
+        title = request.get("title")
+        if config is not None and not isinstance(config, dict):
+            raise ValueError("config must be an object")
+        if title is not None and not isinstance(title, str):
+            raise ValueError("title must be a string")
+        if request.get("id"):
+            transcript_id = request["id"]
+            if not isinstance(transcript_id, str) or not TRANSCRIPT_ID_PATTERN.fullmatch(transcript_id):
+                raise ValueError("invalid transcript id")
+            return self.queue.add(title=title, transcript_id=transcript_id, config=config)
+        if self.audio_root is None:
+            raise ValueError("file requests are disabled, upload the audio instead")
+        if not isinstance(request["file"], str):
+            raise ValueError("file must be a string")
+        audio_path = os.path.realpath(os.path.join(self.audio_root, request["file"]))
+        if os.path.commonpath([self.audio_root, audio_path]) != self.audio_root:
+            raise ValueError(f"file must be under {self.audio_root}")
+        stat = os.stat(audio_path)
+        source_key = f"{audio_path}:{stat.st_size}:{stat.st_mtime_ns}"
+        return self.queue.add(title=title, audio_path=audio_path, source_key=source_key, config=config)
+
+
+def make_handler(service):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/jobs":
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    job_id = service.add_request(json.loads(self.rfile.read(length)))
+                else:
+                    title = parse_qs(url.query).get("title", [None])[0]
+                    job_id = service.add_upload(self.rfile, length, title)
+            except (KeyError, ValueError, OSError) as e:
+                return self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            self.send_json(HTTPStatus.ACCEPTED, {"job": job_id})
+
+        def do_GET(self):
+            parts = urlparse(self.path).path.strip("/").split("/")
+            if len(parts) < 2 or parts[0] != "jobs":
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            job = service.queue.get(parts[1])
+            if job is None:
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": "unknown job"})
+            if len(parts) == 2:
+                return self.send_json(HTTPStatus.OK, {name: job[name] for name in
+                                                      ("id", "status", "title", "transcript_id", "error")})
+            if parts[2] not in ARTIFACTS:
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": "unknown artifact"})
+            if job["status"] != COMPLETED:
+                return self.send_json(HTTPStatus.CONFLICT, {"error": f"job is {job['status']}"})
+            try:
+                artifact_path = os.path.join(service.artifact_dir(job["transcript_id"]), parts[2])
+            except ValueError as e:
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": str(e)})
+            try:
+                f = open(artifact_path, "rb")
+            except FileNotFoundError:
+                return self.send_json(HTTPStatus.NOT_FOUND, {"error": f"{parts[2]} is missing"})
+            with f:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", ARTIFACTS[parts[2]])
+                self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile)
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def submit_audio(service_url, file_path, title=None):
+    """
+    Uploads audio to the service and returns the job id without waiting for the transcript
+    """
+    with open(file_path, "rb") as f:
+        response = requests.post(f"{service_url}/jobs", params={"title": title}, data=f,
+                                 headers={"Content-Type": "application/octet-stream"})
+    if not response.ok:
+        raise Exception(response.text)
+    return response.json()["job"]
+
+
+def submit_transcript_id(service_url, transcript_id, title=None):
+    response = requests.post(f"{service_url}/jobs", json={"id": transcript_id, "title": title})
+    if not response.ok:
+        raise Exception(response.text)
+    return response.json()["job"]
+
+
+def job_status(service_url, job_id):
+    response = requests.get(f"{service_url}/jobs/{job_id}")
+    if not response.ok:
+        raise Exception(response.text)
+    return response.json()
+
+
+def download_artifact(service_url, job_id, artifact, file_path):
+    with requests.get(f"{service_url}/jobs/{job_id}/{artifact}", stream=True) as response:
+        if not response.ok:
+            raise Exception(response.text)
+        with open(file_path, "wb") as f:
+            for data in response.iter_content(assemblyai.CHUNK_SIZE):
+                f.write(data)
+
+
+def main(argv):
+    args = parse_args(argv)
+    service = TranscriptionService(args.cache_dir, workers=args.workers, audio_root=args.audio_root)
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers, cache in {service.cache_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser('Run the shared transcription service')
+    parser.add_argument('--host', default="127.0.0.1",
+                        help='Address to listen on. There is no authentication, only listen on trusted networks')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--cache-dir', default="transcript_cache", help='Directory for the job queue and artifacts')
+    parser.add_argument('--workers', type=int, default=2, help='Number of concurrent upload/export workers')
+    parser.add_argument('--audio-root',
+                        help='Optional: Directory whose audio can be submitted by path instead of uploaded')
+    return parser.parse_args(args=argv)
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))